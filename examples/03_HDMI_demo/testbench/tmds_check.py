@@ -22,30 +22,9 @@ def prettyPrintBinary(input: int, bits=8) -> str:
 	Returns:
 		str: A string representation of the integer in binary, grouped in sets of 4 bits.
 	"""
-	# Ugly-ass function to format binary strings in groups of 4 bits
-	bin_str = f"{input:0{bits}b}"
-	first_group_size = len(bin_str) % 4
-	if first_group_size == 0:
-		first_group_size = 4
-	groups = [bin_str[:first_group_size]]
-	for i in range(first_group_size, len(bin_str), 4):
-		groups.append(bin_str[i:i+4])
-	return ' '.join(groups)
-
-def getBit(input : int, bitpos : int) -> int:
-	"""
-	Extracts the value of a specific bit from an integer.
-	Arguments:
-		input (int): The integer value from which to extract the bit.
-		bitpos (int): The position of the bit to extract (0 for least significant bit).
-	Returns:
-		int: The value of the bit at the specified position (0 or 1).
-	"""
-	return (input & (1 << bitpos)) >> bitpos
-
-def invBit(input : int) -> int:
-	"""Inverts a bit"""
-	return 0 if input else 1
+	# The '_' option already groups binary digits by 4 (starting at the LSB),
+	# the width has to include those separators though
+	return f"{input:0{max(bits + (bits - 1) // 4, 0)}_b}".replace('_', ' ')
 
 def CountOnesInData(input : int, bits = 8) -> int:
 	"""
@@ -56,15 +35,77 @@ def CountOnesInData(input : int, bits = 8) -> int:
 	Returns:
 		int: The count of set bits (1s) in the input integer.
 	"""
-	ones = 0
-	for n in range(bits):
-		if (input & (1 << n)):
-			ones += 1
-	return ones
+	x = input & ((1 << bits) - 1)
+	if bits <= 8:
+		# SWAR popcount: add up neighbouring 1-, 2- and then 4-bit fields
+		x = x - ((x >> 1) & 0x55)
+		x = (x & 0x33) + ((x >> 2) & 0x33)
+		return (x + (x >> 4)) & 0x0F
+	return bin(x).count('1')
+
+def TransitionMinimize(input : int) -> int:
+	"""
+	First stage of the TMDS encoder, the transition-minimizing part.
+	Arguments:
+		input (int): 8-bit input value.
+	Returns:
+		int: The 9-bit q_m value, with q_m[8] set if XOR was used.
+	"""
+	# For this, count the ones in the input. If it exceeds 4 or is equal
+	# to 4 with the LSB=0, then XOR things, otherwise XNOR it.
+	ones_in_data = CountOnesInData(input)
+
+	# XORing/XNORing is as follows:
+	# q_out[0] = input[0]
+	q_m = input & (1 << 0)
+	use_xnor = 1 if (ones_in_data > 4) or ((ones_in_data == 4) and not (input & (1 << 0))) else 0
+
+	# q_out[n] = q_out[n-1] XOR/XNOR input[1]		
+	for n in range(1, 8):
+		# Bit is either 0 or 1, based on the logical operation (XNOR = XOR ^ 1)
+		q_m |= (((q_m >> (n-1)) ^ (input >> n) ^ use_xnor) & 1) << n
+	
+	# 9th bit determines if we used XOR or XNOR, so attach that to q_out
+	q_m |= (use_xnor ^ 1) << 8
+	return q_m
+
+# q_m only depends on the 8-bit input, so precompute it together with the
+# number of ones in q_m[0:7] for every possible byte: ENCODE_LUT[input] = (q_m, ones)
+ENCODE_LUT = tuple((q_m, CountOnesInData(q_m)) for q_m in map(TransitionMinimize, range(256)))
+
+# Control period symbols for C1/C0 = 0..3, as listed in the HDMI 1.3 spec
+CTRL_SYMBOLS = (0b1101010100, 0b0010101011, 0b0101010100, 0b1010101011)
 
-def CountZerosInData(input : int) -> int:
-	"""Get the number of zeros in the input data, only for 8-bit inputs!"""
-	return 8 - CountOnesInData(input)
+def BalanceDisparity(q_m : int, ones : int, cnt : int) -> tuple:
+	"""
+	Second stage of the TMDS encoder, the DS part (Differential Signaling),
+	written without branches.
+	Arguments:
+		q_m (int): 9-bit value from the transition-minimizing stage.
+		ones (int): Number of ones in q_m[0:7].
+		cnt (int): Current data stream disparity.
+	Returns:
+		tuple: The 10-bit TMDS symbol and the updated disparity.
+	"""
+	q_lo = q_m & 0xFF
+	xor_flag = (q_m >> 8) & 1
+
+	# s = N_1{q_m[0:7]} - N_0{q_m[0:7]}
+	s = 2 * ones - 8
+	# If cnt reg is zero OR there are as many 1s as 0s in q_out[0:7] (cnt * s == 0),
+	# invert when XNOR was used. Otherwise invert if cnt and s share the same sign.
+	p = cnt * s
+	invert = (p > 0) | ((p == 0) & (xor_flag ^ 1))
+
+	# q_out[9] = invert, q_out[8] = q_m[8], q_out[0:7] = (invert ? ~q_m[0:7] : q_m[0:7])
+	q_out = (invert << 9) | (xor_flag << 8) | (q_lo ^ (-invert & 0xFF))
+
+	# Count the DC inbalance, which covers all cases of the flowchart:
+	# Cnt(t) = Cnt(t-1) + (invert ? -s : s) + 2 * (q_m[8] + invert - 1)
+	# The last term is zero in the cnt==0/s==0 case (invert == ~q_m[8]),
+	# +2*q_m[8] when inverting and -2*~q_m[8] otherwise
+	cnt += (1 - 2 * invert) * s + 2 * (xor_flag + invert - 1)
+	return q_out, cnt
 
 class TMDS:
 	"""
@@ -81,28 +122,8 @@ class TMDS:
 			raise ValueError("Give me unsigned integers only!")
 		if ctrl > 3:
 			raise ValueError("")
-		# First part of TMDS is transition-minimizing.
-		# For this, count the ones in the input. If it exceeds 4 or is equal
-		# to 4 with the LSB=0, then XOR things, otherwise XNOR it.
-		ones_in_data = CountOnesInData(input)
-
-		# XORing/XNORing is as follows:
-		# q_out[0] = input[0]
-		q_m = input & (1 << 0)
-		use_xnor = True if (ones_in_data > 4) or ((ones_in_data == 4) and not (input & (1 << 0))) else False
-
-		# q_out[n] = q_out[n-1] XOR/XNOR input[1]		
-		for n in range(1, 8):
-			# Bit is either 0 or 1, based on the logical operation
-			bit = getBit(q_m, n-1) ^ getBit(input, n)
-			if use_xnor:
-				bit = 0 if bit else 1 # XNOR 
-			q_m |= (bit << n)       
-		
-		# 9th bit determines if we used XOR or XNOR, so attach that to q_out
-		q_m |= 0 if use_xnor else (1 << 8)
-
-		q_out = 0
+		if ctrl < 0:
+			raise ValueError("Give me unsigned integers only!")
 		# if DE is high, send C1/C0 instead!
 		# I don't get it, DVI 1.0 spec lists
 		# different values for C1/C0 than the HDMI 1.3 spec, that I found.
@@ -112,55 +133,51 @@ class TMDS:
 			#  shall be considered zero by the encoder"
 			# Basically, reset it during the control period.
 			self.encode_cnt = 0
-			if ctrl == 0:
-				q_out = 0b1101010100
-				return q_out, self.encode_cnt
-			elif ctrl == 1:
-				q_out = 0b0010101011
-				return q_out, self.encode_cnt
-			elif ctrl == 2:
-				q_out = 0b0101010100
-				return q_out, self.encode_cnt
-			else:
-				q_out = 0b1010101011
-				return q_out, self.encode_cnt
-
-		# Now the DS part of TMDS (Differential Signaling):
-		# if cnt reg is zero OR there are as many 1s as 0s in q_out[0:7]
-		if (self.encode_cnt == 0) or \
-				(CountOnesInData(q_m & 0xFF) == CountZerosInData(q_m & 0xFF)):
-			q_out = invBit(getBit(q_m, 8)) << 9							# q_out[9] = ~q_m[8]
-			q_out |= q_m & (1 << 8)										# q_out[8] =  q_m[8]
-			q_out |= (q_m & 0xFF) if getBit(q_m, 8) else (~q_m & 0xFF)	# q_out[0:7] = (q_m[8] ? q_m[0:7] : ~q_m[0:7])
-
-			# Count the DC inbalance 
-			if getBit(q_m, 8): # Did we use XOR?
-				# Add counter value with the ones minus the zeros
-				# Cnt(t) = Cnt(t-1) + ( N_1{q_m[0:7]} - N_0{q_m[0:7]} )
-				self.encode_cnt += CountOnesInData(q_m & 0xFF) - CountZerosInData(q_m & 0xFF)
-			else:
-				# Add counter value with the zeros minus the ones
-				# Cnt(t) = Cnt(t-1) + ( N_0{q_m[0:7]} - N_1{q_m[0:7]} )
-				self.encode_cnt += CountZerosInData(q_m & 0xFF) - CountOnesInData(q_m & 0xFF)
-		else:
-			if self.encode_cnt > 0 and \
-					CountOnesInData(q_m & 0xFF) > CountZerosInData(q_m & 0xFF) or \
-					self.encode_cnt < 0 and \
-					CountZerosInData(q_m & 0xFF) > CountOnesInData(q_m & 0xFF):
-				q_out = (1 << 9)
-				q_out |= q_m & (1 << 8)
-				q_out |= (~(q_m & 0xFF) & 0xFF)
-				self.encode_cnt += (getBit(q_m, 8) * 2) + CountZerosInData(q_m & 0xFF) - CountOnesInData(q_m & 0xFF)
-			else:
-				q_out = (0 << 9)
-				q_out |= q_m & (1 << 8)
-				q_out |= (q_m & 0xFF)
-				a = CountOnesInData(q_m & 0xFF)
-				b = CountZerosInData(q_m & 0xFF)
-				c = (invBit(getBit(q_m, 8)) * 2)
-				self.encode_cnt += -(invBit(getBit(q_m, 8)) * 2) + CountOnesInData(q_m & 0xFF) - CountZerosInData(q_m & 0xFF)
+			return CTRL_SYMBOLS[ctrl], self.encode_cnt
+
+		# First part of TMDS is transition-minimizing, which is a pure
+		# function of the input byte and thus looked up from ENCODE_LUT.
+		# The ones of q_m[0:7] are needed for the DS part, so they're in there too
+		q_m, ones = ENCODE_LUT[input]
+		q_out, self.encode_cnt = BalanceDisparity(q_m, ones, self.encode_cnt)
 		return q_out, self.encode_cnt
 	
+	def EncodeStream(self, data, DE, ctrl) -> list:
+		"""
+		Encodes a whole stream of pixels, same as calling Encode for each of them
+		but without the per-call overhead.
+		Arguments:
+			data (iterable of int): 8-bit pixel values.
+			DE (iterable of bool): Data enable for each pixel.
+			ctrl (iterable of int): C1/C0 value for each pixel, used while DE is low.
+		Returns:
+			list: The 10-bit TMDS symbols.
+		"""
+		lut = ENCODE_LUT
+		cnt = self.encode_cnt
+		symbols = []
+		append = symbols.append
+		for input, de, c in zip(data, DE, ctrl):
+			if not (0 <= input <= 255 and 0 <= c <= 3):
+				# Let Encode raise the matching error for the invalid value
+				self.Encode(input, de, c)
+			if not de:
+				# Control period, disparity is reset
+				cnt = 0
+				append(CTRL_SYMBOLS[c])
+				continue
+			# Same as BalanceDisparity, inlined to save the call per symbol.
+			# The __main__ self-check compares the result against Encode.
+			q_m, ones = lut[input]
+			xor_flag = q_m >> 8
+			s = 2 * ones - 8
+			p = cnt * s
+			invert = (p > 0) | ((p == 0) & (xor_flag ^ 1))
+			append((invert << 9) | (q_m ^ (-invert & 0xFF)))
+			cnt += (1 - 2 * invert) * s + 2 * (xor_flag + invert - 1)
+		self.encode_cnt = cnt
+		return symbols
+
 	def Decode(self, input : int) -> int:
 		if input >= 2**10:
 			raise ValueError("Value is more than 10 bit large!")
@@ -169,18 +186,12 @@ class TMDS:
 		if input & (1 << 9):
 			input = (input & 0x300) | (~input & 0xFF)
 		
-		q = input & (1 << 0)
-		# XOR or XNOR?
-		use_xnor = False if input & (1 << 8) else True
-
-		for n in range(1, 8):
-			# Bit is either 0 or 1, based on the logical operation
-			a = getBit(input, n)
-			b = getBit(input, n-1)
-			bit = a ^ b
-			if use_xnor:
-				bit = 0 if bit else 1 # XNOR 
-			q |= (bit << n)     
+		# q[0] = input[0], q[n] = input[n] XOR/XNOR input[n-1]
+		# All bits at once: XOR the data with itself shifted up by one
+		q = (input ^ (input << 1)) & 0xFF
+		# XOR or XNOR? XNOR only flips q[1:7], as q[0] is taken as-is
+		if not input & (1 << 8):
+			q ^= 0xFE
 
 		return q
 
@@ -191,24 +202,39 @@ if __name__ == "__main__":
 		0x00, 0xFF, 0x55, 0xAA, 0x0F, 0xF0, 0x81, 0x7E, 0xFE, 0x01
 	]
 
+	error_cnt = 0
+	edge_symbols = []
 	for test_value in test_cases:
 		tmds, cnt = TMDStest.Encode(test_value)
+		edge_symbols.append(tmds)
 		print(f"Encoded value: {prettyPrintBinary(tmds,10)}, Count: {cnt}")
+	if TMDS().EncodeStream(test_cases, [True] * len(test_cases), [0] * len(test_cases)) != edge_symbols:
+		error_cnt += 1
+		print("ERROR: EncodeStream does not match Encode for the edge cases!")
 
 	# Automated test with stimuli/results pulled from the reference waveform found at
 	# https://fpga.mit.edu/6205/F24/assignments/hdmi/tmds_ds
-	error_cnt = 0
 	print("Starting automated TMDS tests...")
 	with open('tests/stimuli.csv', newline='') as csvfile:
-		reader = csv.DictReader(csvfile, delimiter=';')
+		reader = csv.reader(csvfile, delimiter=';')
+		# Look up the column positions once from the header,
+		# instead of building a dict for every single row
+		header = next(reader)
+		columns = [header.index(name) for name in (
+			'tmds_encoder.data_in', 'tmds_encoder.ve_in',
+			'tmds_encoder.control_in', 'tmds_encoder.q_out')]
 		tmds = TMDS()
-		dc_balance = 0
-		for idx, row in enumerate(reader, start=1):
-			data_in = int(row['tmds_encoder.data_in'])
-			de = bool(int(row['tmds_encoder.ve_in']))
-			ctrl = int(row['tmds_encoder.control_in'])
-			expected_q_out = int(row['tmds_encoder.q_out'])
+		stream_data, stream_de, stream_ctrl, encoded = [], [], [], []
+		# DictReader used to skip empty lines, csv.reader hands them over as [],
+		# so filter them out (before numbering, to keep the row numbers the same)
+		for idx, row in enumerate(filter(None, reader), start=1):
+			data_in, de, ctrl, expected_q_out = [int(row[col]) for col in columns]
+			de = bool(de)
 			q_out, cnt = tmds.Encode(data_in, de, ctrl)
+			stream_data.append(data_in)
+			stream_de.append(de)
+			stream_ctrl.append(ctrl)
+			encoded.append(q_out)
 			q_in = tmds.Decode(q_out)
 			if q_out != expected_q_out:
 				print(f"Data in: {data_in:02x}, DE: {de}, CTRL: {ctrl}, Encoded: {prettyPrintBinary(q_out,10)}, Cnt: {cnt}")
@@ -218,6 +244,11 @@ if __name__ == "__main__":
 				error_cnt += 1
 				print(f'Decoding failed!')
 
+	# The bulk encoder has to produce the very same symbols as Encode
+	if TMDS().EncodeStream(stream_data, stream_de, stream_ctrl) != encoded:
+		error_cnt += 1
+		print("ERROR: EncodeStream does not match Encode!")
+
 	if error_cnt == 0:
 		print("All tests passed successfully!")
 	else: